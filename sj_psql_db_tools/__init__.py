@@ -1,13 +1,69 @@
-from sj_psql_db_tools.connector import PSQLDBConnector
-from sj_psql_db_tools.helpers import *
-from sj_psql_db_tools.models import *
+from importlib import import_module
+from typing import TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from sj_psql_db_tools.connector import PSQLDBConnector, CircuitBreakerOpenError
+    from sj_psql_db_tools.query_generator import QueryGenerator
+    from sj_psql_db_tools.helpers import createTable, createArchiveTable
+    from sj_psql_db_tools.models import QueryResponse, DBObject, Field, PSQLKeywords, PSQLKeyword
+
+# Public names are resolved on first access, so importing the package (or only the query generator and models)
+# does not pull in pg8000 and its dependencies
+_lazy_attrs = {
+    "PSQLDBConnector": "sj_psql_db_tools.connector",
+    "CircuitBreakerOpenError": "sj_psql_db_tools.connector",
+    "QueryGenerator": "sj_psql_db_tools.query_generator",
+    "createTable": "sj_psql_db_tools.helpers",
+    "createArchiveTable": "sj_psql_db_tools.helpers",
+    "QueryResponse": "sj_psql_db_tools.models",
+    "DBObject": "sj_psql_db_tools.models",
+    "Field": "sj_psql_db_tools.models",
+    "PSQLKeywords": "sj_psql_db_tools.models",
+    "PSQLKeyword": "sj_psql_db_tools.models",
+}
+
+# Submodules the package namespace exposed when it star-imported helpers and models
+_lazy_submodules = {
+    "connector": "sj_psql_db_tools.connector",
+    "query_generator": "sj_psql_db_tools.query_generator",
+    "helpers": "sj_psql_db_tools.helpers",
+    "app_db_operations": "sj_psql_db_tools.helpers.app_db_operations",
+    "models": "sj_psql_db_tools.models",
+    "query_response": "sj_psql_db_tools.models.query_response",
+    "db_obj": "sj_psql_db_tools.models.db_obj",
+    "field": "sj_psql_db_tools.models.field",
+    "psql_keywords": "sj_psql_db_tools.models.psql_keywords",
+}
+
+__all__ = [*_lazy_attrs, "createDBConn"]
+
+
+def __getattr__(name: str):
+    if name in _lazy_submodules:
+        value = import_module(_lazy_submodules[name])
+
+    elif name in _lazy_attrs:
+        value = getattr(import_module(_lazy_attrs[name]), name)
+
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value  # Cache so later lookups skip __getattr__
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_lazy_submodules))
+
+
+def createDBConn(db_config: dict) -> "PSQLDBConnector":
+    from sj_psql_db_tools.connector import PSQLDBConnector
 
-def createDBConn(db_config: dict) -> PSQLDBConnector:
     return PSQLDBConnector(
         host=db_config.get("host"),
         port=db_config.get("port"),
         database=db_config.get("database"),
         user=db_config.get("user"),
         password=db_config.get("password")
-    )
\ No newline at end of file
+    )
@@ -1,19 +1,104 @@
-from pg8000 import connect, Connection, ProgrammingError
+import logging
+import random
+import time
+from contextlib import contextmanager
+from pg8000 import connect, Connection, DatabaseError, Error, InterfaceError, ProgrammingError
 from sj_psql_db_tools.models import QueryResponse
 from sj_psql_db_tools.query_generator import QueryGenerator
 
 
+class CircuitBreakerOpenError(Error):
+    """
+    Raised without touching the network while the connector's circuit breaker is open
+    """
+
+
+class CircuitBreaker:
+    closed = "closed"
+    open = "open"
+    half_open = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+
+        :param failure_threshold: Consecutive connection failures after which the circuit opens
+        :param reset_timeout: Seconds to wait while open before letting a trial connection through
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.failures = 0
+        self._opened_at = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.closed
+
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.half_open
+
+        return self.open
+
+    def allow(self) -> bool:
+        return self.state != self.open
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> bool:
+        """
+        :return: True if this failure opened (or re-opened) the circuit
+        """
+        self.failures += 1
+
+        if self.state == self.half_open or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            return True
+
+        return False
+
+
 class PSQLDBConnector:
     _host = "localhost"
     _port = 5432
     _database = "postgres"
     _user = "postgres"
 
-    _connection: Connection
+    _connection: Connection | None = None
 
     _q_gen = QueryGenerator()
 
+    # Messages pg8000 uses when the socket went away, e.g. a bare "network error" when the server closed it
+    _connection_error_messages = (
+        "network error",
+        "communication error",
+        "connection is closed",
+    )
+
+    # SQLSTATE codes after which a whole transaction can safely be run again
+    _retryable_sql_states = {
+        "40001",  # serialization_failure
+        "40P01",  # deadlock_detected
+    }
+
     def __init__(self, **kwargs):
+        """
+
+        :keyword host: Database host (default: localhost)
+        :keyword port: Database port (default: 5432)
+        :keyword database: Database name (default: postgres)
+        :keyword user: Database user (default: postgres)
+        :keyword password: Database password
+        :keyword autocommit: Whether to commit after every query outside a transaction block, when off a lost
+            connection is never replaced silently and reconnect() has to be called (default: True)
+        :keyword max_retries: Retries for connecting, idempotent reads and transactions (default: 3)
+        :keyword retry_backoff: Base delay in seconds for exponential backoff (default: 0.1)
+        :keyword retry_max_backoff: Upper bound in seconds for a single backoff delay (default: 5.0)
+        :keyword circuit_failure_threshold: Consecutive connection failures that open the circuit (default: 5)
+        :keyword circuit_reset_timeout: Seconds the circuit stays open before a trial connection (default: 30.0)
+        """
         self.host = kwargs.get("host", self._host)
         self.port = kwargs.get("port", self._port)
         self.database = kwargs.get("database", self._database)
@@ -21,31 +106,183 @@ class PSQLDBConnector:
         self.password = kwargs.get("password")
 
         self._autocommit = kwargs.get("autocommit", True)
+        self._in_transaction = False
+
+        self.max_retries = kwargs.get("max_retries", 3)
+        self.retry_backoff = kwargs.get("retry_backoff", 0.1)
+        self.retry_max_backoff = kwargs.get("retry_max_backoff", 5.0)
 
-        self._connection = connect(
-            host=self.host,
-            port=self.port,
-            database=self.database,
-            user=self.user,
-            password=self.password
+        self._circuit_breaker = CircuitBreaker(
+            failure_threshold=kwargs.get("circuit_failure_threshold", 5),
+            reset_timeout=kwargs.get("circuit_reset_timeout", 30.0)
         )
 
+        self._metrics = {
+            "connects": 0,
+            "reconnects": 0,
+            "connection_failures": 0,
+            "retries": 0,
+            "transaction_retries": 0,
+            "circuit_opens": 0,
+            "circuit_rejections": 0,
+        }
+
+        self._connect()
+
     def __del__(self):
         try:
-            if self._connection:
-                self._connection.close()
+            self.close()
+
+        except Exception as e:  # Never raise from the finalizer, but leave a trace
+            logging.warning(f"Error while closing database connection during cleanup: {e!r}")
+
+    @property
+    def metrics(self) -> dict:
+        return {
+            **self._metrics,
+            "circuit_state": self._circuit_breaker.state,
+        }
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connection is not None
+
+    @classmethod
+    def _is_connection_error(cls, e: Exception) -> bool:
+        # Only transport failures count, other InterfaceErrors (bad parameters, failed transaction block, COPY misuse)
+        # will fail the same way again and must not trigger reconnects or open the circuit
+        if isinstance(e, OSError):
+            return True
+
+        return isinstance(e, InterfaceError) and (
+            isinstance(e.__cause__, OSError) or (bool(e.args) and e.args[0] in cls._connection_error_messages)
+        )
+
+    @classmethod
+    def _is_retryable_error(cls, e: Exception) -> bool:
+        return isinstance(e, DatabaseError) and bool(e.args) and isinstance(e.args[0], dict) \
+            and e.args[0].get("C") in cls._retryable_sql_states
+
+    def _backoff(self, attempt: int) -> None:
+        # Exponential backoff with full jitter, so clients dropped together do not come back together
+        time.sleep(random.uniform(0, min(self.retry_max_backoff, self.retry_backoff * 2 ** (attempt - 1))))
+
+    def _connect(self) -> Connection:
+        attempt = 0
+
+        while True:
+            if not self._circuit_breaker.allow():
+                self._metrics["circuit_rejections"] += 1
+                raise CircuitBreakerOpenError(
+                    f"Circuit breaker is open after {self._circuit_breaker.failures} consecutive connection failures"
+                )
+
+            try:
+                self._connection = connect(
+                    host=self.host,
+                    port=self.port,
+                    database=self.database,
+                    user=self.user,
+                    password=self.password
+                )
+
+            except (InterfaceError, OSError) as e:
+                if not self._is_connection_error(e):
+                    raise
+
+                self._metrics["connection_failures"] += 1
+
+                if self._circuit_breaker.record_failure():
+                    self._metrics["circuit_opens"] += 1
+                    logging.error(f"Circuit breaker opened for {self.host}:{self.port}")
+                    raise
+
+                if attempt >= self.max_retries:
+                    raise
+
+                attempt += 1
+                logging.warning(f"Connection to {self.host}:{self.port} failed ({e}), retry {attempt}/{self.max_retries}")
+                self._backoff(attempt)
+                continue
+
+            self._circuit_breaker.record_success()
+
+            if self._metrics["connects"]:
+                self._metrics["reconnects"] += 1
+
+            self._metrics["connects"] += 1
+
+            return self._connection
+
+    def _drop_connection(self) -> None:
+        connection, self._connection = self._connection, None
+
+        try:
+            if connection is not None:
+                connection.close()
+
+        except (InterfaceError, OSError):
+            ...  # Already dead, which is why it is being dropped
+
+    def _rollback(self) -> None:
+        if self._connection is None:
+            return
+
+        try:
+            self._connection.cursor().execute("rollback;")
+
+        except (InterfaceError, OSError) as e:
+            if not self._is_connection_error(e):
+                logging.warning(f"Rollback failed, dropping connection: {e}")
+
+            self._drop_connection()  # Transaction state is unknown, start over on a fresh connection
+
+    def reconnect(self) -> None:
+        self._drop_connection()
+        self._in_transaction = False
+        self._connect()
+
+    def close(self) -> None:
+        if self._connection is None:
+            return
+
+        try:
+            self._connection.close()
+
+        except (InterfaceError, OSError) as e:
+            logging.warning(f"Error while closing database connection: {e}")
+
+        finally:
+            self._connection = None
+
+    @property
+    def _holds_transaction(self) -> bool:
+        # Without autocommit the driver keeps an implicit transaction open across calls, just like a transaction block
+        return self._in_transaction or not self._autocommit
+
+    def _ensure_connection(self) -> Connection:
+        if self._connection is None:
+            if self._holds_transaction:
+                # Uncommitted work died with the old connection, a silent reconnect would hide that from the caller,
+                # who has to call reconnect() once they have dealt with it
+                raise InterfaceError("connection is closed")
 
-        except AttributeError:
-            ...
+            self._connect()
 
-    def execute(self, query: str):
+        return self._connection
+
+    def _execute(self, query: str) -> QueryResponse:
         c = self._connection.cursor()
 
         try:
             c.execute(query)
 
-        except ProgrammingError:
-            c.execute("rollback;")  # Close current transaction before raising
+        except DatabaseError:
+            # Inside a transaction block the rollback is left to transaction(), rolling back here would let the
+            # rest of the block run, and commit, in a new implicit transaction
+            if not self._in_transaction:
+                c.execute("rollback;")  # Close current transaction before raising
+
             raise
 
         try:
@@ -59,13 +296,135 @@ class PSQLDBConnector:
             columns=[] if c.description is None else [desc[0] for desc in c.description]
         )
 
-        if self._autocommit:
+        if self._autocommit and not self._in_transaction:
             c.execute(f"commit;")
 
         del c
 
         return res
 
+    def execute(self, query: str, retry: bool = False) -> QueryResponse:
+        """
+        Executes a query, reconnecting first if the previous connection was lost
+
+        :param query: Query to be executed
+        :param retry: Whether the query is safe to run again after a dropped connection, only honoured outside
+            transaction blocks and with autocommit on (default: False)
+
+        :return: Query response
+        """
+        attempt = 0
+
+        while True:
+            self._ensure_connection()  # Retries on its own, a failure here is final
+
+            try:
+                return self._execute(query)
+
+            except (InterfaceError, OSError) as e:
+                if not self._is_connection_error(e):
+                    raise
+
+                self._drop_connection()
+
+                if not retry or self._holds_transaction or attempt >= self.max_retries:
+                    raise
+
+                attempt += 1
+                self._metrics["retries"] += 1
+                logging.warning(f"Connection lost while executing query ({e}), retry {attempt}/{self.max_retries}")
+                self._backoff(attempt)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the queries executed inside the block in a single transaction, committed when the block exits and
+        rolled back on error. Nested blocks join the outer transaction.
+        """
+        if self._in_transaction:
+            yield self
+            return
+
+        self._ensure_connection()
+
+        self._in_transaction = True
+
+        try:
+            yield self
+
+        except BaseException:
+            self._in_transaction = False
+            self._rollback()
+            raise
+
+        self._in_transaction = False
+
+        if self._connection is None:
+            # A query in the block lost the connection and the caller carried on, nothing left to commit
+            raise InterfaceError("connection is closed")
+
+        try:
+            self._connection.cursor().execute("commit;")
+
+        except (InterfaceError, OSError) as e:
+            if self._is_connection_error(e):
+                self._drop_connection()
+
+            else:
+                self._rollback()
+
+            raise
+
+        except DatabaseError:
+            self._rollback()
+            raise
+
+    def runInTransaction(self, func, *args, **kwargs):
+        """
+        Calls func(db, *args, **kwargs) inside a transaction block, running it again from the start on
+        serialization failures (40001), deadlocks (40P01) and connections lost before commit. Inside an outer
+        transaction block, or with autocommit off, func runs once as part of the open transaction.
+
+        :param func: Callable doing the transaction's work, receives this connector as first argument
+
+        :return: Whatever func returns
+        """
+        if self._holds_transaction:
+            # Joined an open transaction, which is aborted on failure, only its owner can roll back and retry
+            return func(self, *args, **kwargs)
+
+        attempt = 0
+
+        while True:
+            committing = False
+
+            self._ensure_connection()  # Retries on its own, a failure here is final
+
+            try:
+                with self.transaction():
+                    result = func(self, *args, **kwargs)
+                    committing = True
+
+                return result
+
+            except (InterfaceError, OSError) as e:
+                # If the commit itself was cut off, its outcome is unknown and the work must not be replayed
+                if committing or not self._is_connection_error(e) or attempt >= self.max_retries:
+                    raise
+
+                error = e
+
+            except DatabaseError as e:
+                if not self._is_retryable_error(e) or attempt >= self.max_retries:
+                    raise
+
+                error = e
+
+            attempt += 1
+            self._metrics["transaction_retries"] += 1
+            logging.warning(f"Transaction failed ({error}), retry {attempt}/{self.max_retries}")
+            self._backoff(attempt)
+
     def getData(self, obj_name, **kwargs) -> QueryResponse:
         return self.execute(
             self._q_gen.generate_select_query(
@@ -74,7 +433,8 @@ class PSQLDBConnector:
                 where=kwargs.get("where"),
                 limit=kwargs.get("limit"),
                 offset=kwargs.get("offset")
-            )
+            ),
+            retry=True  # Reads are idempotent
         )
 
     def insertData(self, obj_name, data: list[dict], returning: bool | list | str = False) -> QueryResponse:
@@ -94,4 +454,4 @@ class PSQLDBConnector:
                 where,
                 returning
             )
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,300 @@
+import pytest
+from pg8000 import DatabaseError, InterfaceError
+
+import sj_psql_db_tools.connector as connector
+from sj_psql_db_tools.connector import CircuitBreakerOpenError, PSQLDBConnector
+from sj_psql_db_tools.models import DBObject
+
+
+def transport_error(message: str, cause: OSError) -> InterfaceError:
+    # pg8000 chains the socket error, the connector relies on that to tell network failures apart
+    try:
+        raise InterfaceError(message) from cause
+
+    except InterfaceError as e:
+        return e
+
+
+def network_error() -> InterfaceError:
+    return transport_error("network error", ConnectionResetError())
+
+
+class FakeServer:
+    """
+    Stands in for pg8000: records every statement and fails the ones it has been told to fail
+    """
+    def __init__(self):
+        self.log = []
+        self.connects = 0
+        self.connect_attempts = 0
+        self.sleeps = []
+        self.refuse = 0  # Number of upcoming connects to refuse
+        self.connect_error = None  # Raised by every connect while set
+        self.fail = []  # (statement prefix, exception) pairs, each used once
+
+    def connect(self, **kwargs):
+        self.connect_attempts += 1
+
+        if self.connect_error is not None:
+            raise self.connect_error
+
+        if self.refuse:
+            self.refuse -= 1
+            raise transport_error("Can't create a connection", ConnectionRefusedError())
+
+        self.connects += 1
+
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, server: FakeServer):
+        self.server = server
+
+    def cursor(self):
+        return FakeCursor(self.server)
+
+    def close(self):
+        ...
+
+
+class FakeCursor:
+    description = [("x",)]
+
+    def __init__(self, server: FakeServer):
+        self.server = server
+
+    def execute(self, query: str):
+        self.server.log.append(query)
+
+        for i, (prefix, error) in enumerate(self.server.fail):
+            if query.startswith(prefix):
+                del self.server.fail[i]
+                raise error
+
+    @staticmethod
+    def fetchall():
+        return ((1,),)
+
+
+def server_error(code: str) -> DatabaseError:
+    return DatabaseError({"S": "ERROR", "C": code, "M": f"error {code}"})
+
+
+@pytest.fixture
+def server(monkeypatch) -> FakeServer:
+    server = FakeServer()
+    monkeypatch.setattr(connector, "connect", server.connect)
+    monkeypatch.setattr(connector.time, "sleep", server.sleeps.append)
+
+    return server
+
+
+@pytest.fixture
+def db(server) -> PSQLDBConnector:
+    return PSQLDBConnector(circuit_failure_threshold=3, circuit_reset_timeout=30.0)
+
+
+def test_reconnects_after_dropped_connection(server, db):
+    server.fail.append(("select", network_error()))
+
+    with pytest.raises(InterfaceError):
+        db.execute("select 1")
+
+    assert not db.is_connected
+
+    assert db.execute("select 1").data == ((1,),)
+    assert db.metrics["reconnects"] == 1
+
+
+def test_get_data_is_retried(server, db):
+    server.fail.append(("SELECT", network_error()))
+
+    assert db.getData(DBObject("s", "t")).data == ((1,),)
+    assert [q for q in server.log if q.startswith("SELECT")] == ['SELECT * FROM "s"."t"'] * 2
+    assert db.metrics["retries"] == 1
+
+
+def test_retries_back_off(server, db):
+    server.fail += [("SELECT", network_error()), ("SELECT", network_error())]
+
+    db.getData(DBObject("s", "t"))
+
+    assert len(server.sleeps) == 2
+
+
+def test_exhausted_connect_is_not_retried_again(server):
+    db = PSQLDBConnector(circuit_failure_threshold=100)
+    db.close()
+    server.refuse = 100
+
+    with pytest.raises(InterfaceError):
+        db.getData(DBObject("s", "t"))
+
+    assert server.connect_attempts == 1 + db.max_retries + 1  # Initial connect, then one connect loop
+
+    with pytest.raises(InterfaceError):
+        db.runInTransaction(lambda d: d.execute("update t"))
+
+    assert server.connect_attempts == 1 + 2 * (db.max_retries + 1)
+
+
+def test_no_silent_reconnect_without_autocommit(server):
+    db = PSQLDBConnector(autocommit=False)
+    db.execute("insert into t values (1)")
+    server.fail.append(("SELECT", network_error()))
+
+    with pytest.raises(InterfaceError):
+        db.getData(DBObject("s", "t"))
+
+    # The uncommitted insert is gone, later calls must not carry on as if it was not
+    with pytest.raises(InterfaceError):
+        db.execute("commit;")
+
+    assert server.log == ["insert into t values (1)", 'SELECT * FROM "s"."t"']
+    assert db.metrics["retries"] == 0
+
+    db.reconnect()
+
+    assert db.execute("select 1").data == ((1,),)
+
+
+def test_writes_are_not_replayed(server, db):
+    server.fail.append(("insert", network_error()))
+
+    with pytest.raises(InterfaceError):
+        db.execute("insert into t values (1)")
+
+    assert server.log.count("insert into t values (1)") == 1
+    assert db.metrics["retries"] == 0
+
+
+def test_non_network_interface_error_is_not_retried(server):
+    server.connect_error = InterfaceError("The 'user' connection parameter cannot be None")
+
+    with pytest.raises(InterfaceError):
+        PSQLDBConnector()
+
+    server.connect_error = None
+    db = PSQLDBConnector()
+    server.fail.append(("commit", InterfaceError("in failed transaction block")))
+
+    with pytest.raises(InterfaceError):
+        with db.transaction():
+            db.execute("update t")
+
+    assert db.is_connected
+    assert db.metrics["reconnects"] == 0
+    assert server.log[-1] == "rollback;"
+
+
+def test_server_error_in_block_is_not_rolled_back_early(server, db):
+    server.fail.append(("update", server_error("23505")))
+
+    with db.transaction():
+        db.execute("insert a")
+
+        with pytest.raises(DatabaseError):
+            db.execute("update t")
+
+        db.execute("insert b")
+
+    # No rollback between the failed statement and the rest of the block, the server keeps it aborted (25P02)
+    assert server.log == ["insert a", "update t", "insert b", "commit;"]
+
+
+def test_connection_lost_in_block_fails_on_exit(server, db):
+    server.fail.append(("update", network_error()))
+
+    with pytest.raises(InterfaceError, match="connection is closed"):
+        with db.transaction():
+            try:
+                db.execute("update t")
+
+            except InterfaceError:
+                ...
+
+    assert "commit;" not in server.log
+
+
+@pytest.mark.parametrize("code", ["40001", "40P01"])
+def test_transaction_rerun_on_retryable_error(server, db, code):
+    server.fail.append(("update", server_error(code)))
+
+    assert db.runInTransaction(lambda d: d.execute("update t").data) == ((1,),)
+    assert server.log[-2:] == ["update t", "commit;"]
+    assert "rollback;" in server.log
+    assert db.metrics["transaction_retries"] == 1
+
+
+def test_transaction_not_rerun_on_other_errors(server, db):
+    server.fail.append(("update", server_error("23505")))
+
+    with pytest.raises(DatabaseError):
+        db.runInTransaction(lambda d: d.execute("update t"))
+
+    assert db.metrics["transaction_retries"] == 0
+
+
+def test_nested_transaction_is_not_rerun(server, db):
+    server.fail.append(("update", server_error("40001")))
+
+    with pytest.raises(DatabaseError):
+        with db.transaction():
+            db.execute("insert outer")
+            db.runInTransaction(lambda d: d.execute("update t"))
+
+    assert server.log.count("update t") == 1
+    assert "commit;" not in server.log
+    assert server.log[-1] == "rollback;"
+
+
+def test_commit_failure_rolls_back(server, db):
+    server.fail.append(("commit", server_error("40001")))
+
+    assert db.runInTransaction(lambda d: d.execute("update t").data) == ((1,),)
+    assert server.log == ["update t", "commit;", "rollback;", "update t", "commit;"]
+
+
+def test_lost_commit_is_not_replayed(server, db):
+    server.fail.append(("commit", network_error()))
+
+    with pytest.raises(InterfaceError):
+        db.runInTransaction(lambda d: d.execute("update t"))
+
+    assert server.log.count("update t") == 1
+
+
+def test_circuit_breaker_opens_and_recovers(server, db, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(connector.time, "monotonic", lambda: now[0])
+
+    db.close()
+    server.refuse = 10
+
+    with pytest.raises(InterfaceError):
+        db.execute("select 1")
+
+    assert db.metrics["connection_failures"] == 3
+    assert db.metrics["circuit_state"] == "open"
+
+    with pytest.raises(CircuitBreakerOpenError):
+        db.execute("select 1")
+
+    assert db.metrics["circuit_rejections"] == 1
+
+    # A failed trial connection while half open re-opens the circuit straight away
+    now[0] += 30.0
+    assert db.metrics["circuit_state"] == "half_open"
+
+    with pytest.raises(InterfaceError):
+        db.execute("select 1")
+
+    assert db.metrics["circuit_state"] == "open"
+    assert db.metrics["circuit_opens"] == 2
+
+    now[0] += 30.0
+    server.refuse = 0
+
+    assert db.execute("select 1").data == ((1,),)
+    assert db.metrics["circuit_state"] == "closed"
@@ -0,0 +1,58 @@
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+DRIVER_MODULES = ("pg8000", "scramp", "asn1crypto", "dateutil")
+
+# Package import must stay well below the cost of importing the driver, measured in the same run so the check
+# holds on fast and slow machines alike
+MAX_SHARE_OF_DRIVER_IMPORT = 0.5
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+
+
+def test_query_generation_does_not_import_driver():
+    res = run_python(
+        "-c",
+        "import sys\n"
+        "import sj_psql_db_tools\n"
+        "from sj_psql_db_tools import QueryGenerator, Field, DBObject\n"
+        "QueryGenerator().generate_select_query(DBObject('s', 't', [Field('a')]))\n"
+        f"print(','.join(m for m in {DRIVER_MODULES!r} if m in sys.modules))"
+    )
+
+    assert res.stdout.strip() == ""
+
+
+def test_submodules_still_reachable_from_package():
+    res = run_python(
+        "-c",
+        "import sj_psql_db_tools\n"
+        "print(sj_psql_db_tools.query_response.QueryResponse.__name__, sj_psql_db_tools.field.Field.__name__)"
+    )
+
+    assert res.stdout.split() == ["QueryResponse", "Field"]
+
+
+def cumulative_import_times(code: str) -> dict[str, int]:
+    res = run_python("-X", "importtime", "-c", code)
+
+    # Lines look like: "import time:       123 |        456 | sj_psql_db_tools"
+    return {
+        line.split("|")[2].strip(): int(line.split("|")[1])
+        for line in res.stderr.splitlines()
+        if line.startswith("import time:") and line.split("|")[1].strip().isdigit()
+    }
+
+
+def test_import_time_budget():
+    package = cumulative_import_times("import sj_psql_db_tools; from sj_psql_db_tools import QueryGenerator")
+    driver = cumulative_import_times("import pg8000")
+
+    package_us = package["sj_psql_db_tools"] + package.get("sj_psql_db_tools.query_generator", 0)
+
+    assert package_us < driver["pg8000"] * MAX_SHARE_OF_DRIVER_IMPORT